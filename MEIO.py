@@ -1,7 +1,39 @@
+import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+# Optional fast CSV parsers – polars and pyarrow both parse multi-MB
+# files several times faster than pandas (multithreaded tokenizers);
+# fall back silently when neither is installed.
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
+
+# polars' DataFrame.to_pandas() itself requires pyarrow, and every use of
+# polars here ends in that conversion, so the polars fast path is only
+# usable when both libraries import.
+if pl is not None and pacsv is None:
+    pl = None
+
+# Optional JIT for the SS kernel – fuses the whole arithmetic + clamp
+# into one parallel pass when numba is installed.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # -------------------------------------------------------------------
 # APP CONFIG
 # -------------------------------------------------------------------
@@ -20,8 +52,79 @@ EXPECTED_FILES = {
     "leadtime_history": "leadtime_history_24m_piacenza.csv",
 }
 
+DISPLAY_NAMES = {
+    "sales_history": "Sales History (24m)",
+    "products_master": "Products Master",
+    "product_lifecycle": "Product Lifecycle",
+    "sales_forecast": "Sales Forecast (12m)",
+    "leadtime_history": "Lead Time History (24m)",
+}
+
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Known schemas for the baseline CSVs. Declaring dtypes up front lets the
+# parser allocate typed buffers directly instead of inferring through
+# object arrays; columns not listed here keep default inference, so the
+# schemas stay forward-compatible with extra columns.
+BASELINE_SCHEMAS = {
+    "sales_history": {
+        "material_code": "string",
+        "shop": "string",
+        "business_unit": "string",
+        "sales_qty_capped": "float32",
+        "promo_flag": "bool",
+        "seasonality_factor": "float32",
+        "bu_correlation_factor": "float32",
+        "capacity_factor": "float32",
+    },
+    "products_master": {
+        "material_code": "string",
+        "description": "string",
+        "business_unit": "string",
+        "MOQ": "int32",
+        "rounding_multiple": "int32",
+    },
+    "product_lifecycle": {
+        "material_code": "string",
+        "description": "string",
+        "business_unit": "string",
+    },
+    "sales_forecast": {
+        "material_code": "string",
+        "shop": "string",
+        "forecast_qty": "float32",
+    },
+    "leadtime_history": {
+        "material_code": "string",
+        "shop": "string",
+        "leadtime_days": "float32",
+    },
+}
+
+BASELINE_DATE_COLS = {
+    "sales_history": ["date"],
+    "product_lifecycle": ["intro_date", "phaseout_date"],
+    "sales_forecast": ["date"],
+    "leadtime_history": ["date"],
+}
+
+# BASELINE_SCHEMAS uses pandas dtype names; translate them for the fast
+# parsers so the declared schema applies whichever parser ends up running
+if pl is not None:
+    POLARS_DTYPES = {
+        "string": pl.String,
+        "float32": pl.Float32,
+        "int32": pl.Int32,
+        "bool": pl.Boolean,
+    }
+if pacsv is not None:
+    ARROW_DTYPES = {
+        "string": pa.string(),
+        "float32": pa.float32(),
+        "int32": pa.int32(),
+        "bool": pa.bool_(),
+    }
+
 # -------------------------------------------------------------------
 # SESSION STATE INIT
 # -------------------------------------------------------------------
@@ -37,13 +140,124 @@ if "params" not in st.session_state:
 st.sidebar.header("Data Inputs")
 
 
-def load_default_or_uploaded(label_key: str, display_name: str):
+def read_csv_fast(src, dtype=None, parse_dates=None) -> pd.DataFrame:
+    """
+    Read a CSV (path or raw bytes) into a pandas DataFrame, preferring the
+    multithreaded parsers: polars, then pyarrow, then pd.read_csv.
+
+    `dtype` takes pandas dtype names and is translated for whichever
+    parser runs; `parse_dates` maps to try_parse_dates on polars and is
+    covered by pyarrow's own timestamp inference.
+    """
+    if pl is not None:
+        overrides = None
+        if dtype:
+            overrides = {
+                c: POLARS_DTYPES[t] for c, t in dtype.items() if t in POLARS_DTYPES
+            }
+        return pl.read_csv(
+            src,
+            schema_overrides=overrides,
+            try_parse_dates=parse_dates is not None,
+        ).to_pandas()
+    if pacsv is not None:
+        import io
+
+        buf = io.BytesIO(src) if isinstance(src, bytes) else src
+        convert_options = None
+        if dtype:
+            convert_options = pacsv.ConvertOptions(
+                column_types={
+                    c: ARROW_DTYPES[t] for c, t in dtype.items() if t in ARROW_DTYPES
+                }
+            )
+        table = pacsv.read_csv(
+            buf,
+            read_options=pacsv.ReadOptions(use_threads=True),
+            convert_options=convert_options,
+        )
+        return table.to_pandas()
+    if isinstance(src, bytes):
+        import io
+
+        src = io.BytesIO(src)
+    return pd.read_csv(src, dtype=dtype, parse_dates=parse_dates)
+
+
+def _baseline_signature() -> tuple:
+    """(label_key, path, mtime, size) per present baseline file.
+
+    One os.stat per expected file per rerun covers existence, mtime and
+    size at once, and files added or removed mid-session are picked up
+    on the next rerun.
+    """
+    entries = []
+    for label_key, fname in EXPECTED_FILES.items():
+        path = os.path.join(ROOT_DIR, fname)
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        entries.append((label_key, path, info.st_mtime, info.st_size))
+    return tuple(entries)
+
+
+@st.cache_resource(show_spinner=False)
+def _read_baselines(sig: tuple) -> tuple:
+    """
+    Parse every present baseline CSV once, in parallel. `sig` comes from
+    _baseline_signature() and doubles as the cache key (mtime/size bust
+    the cache on file edits). The CSV tokenizers release the GIL, so one
+    thread per file scales the cold start across cores.
+
+    Returns (frames, errors), both keyed by label: a file that fails to
+    parse lands in `errors` and degrades only that source, the other
+    files still load.
+
+    cache_resource returns the same dict and frames on every rerun (no
+    per-call copies), so callers must treat them as read-only.
+    """
+
+    def _parse(entry):
+        label_key, path, _, _ = entry
+        try:
+            df = read_csv_fast(
+                path,
+                dtype=BASELINE_SCHEMAS.get(label_key),
+                parse_dates=BASELINE_DATE_COLS.get(label_key),
+            )
+            return label_key, df, None
+        except Exception as e:
+            return label_key, None, e
+
+    frames = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=len(sig) or 1) as ex:
+        for label_key, df, err in ex.map(_parse, sig):
+            if err is None:
+                frames[label_key] = df
+            else:
+                errors[label_key] = err
+    return frames, errors
+
+
+@st.cache_resource(show_spinner=False)
+def _read_uploaded_csv(name: str, size: int, head_hash: int, _data: bytes) -> pd.DataFrame:
+    # Keyed on (name, size, hash of the first 4 KB); _data itself is not
+    # hashed. cache_resource hands back the same object every rerun, so
+    # downstream code must treat the frame as read-only.
+    return read_csv_fast(_data)
+
+
+def load_default_or_uploaded(label_key: str, baselines: dict):
     """
     Handles a single CSV source:
     - Tries file_uploader
-    - If none uploaded, tries to load from ROOT_DIR with the expected file name
+    - If none uploaded, falls back to the pre-resolved baseline frames
+      (parsed once per rerun, see below)
     """
     expected_fname = EXPECTED_FILES[label_key]
+    display_name = DISPLAY_NAMES[label_key]
 
     uploaded_file = st.sidebar.file_uploader(
         f"{display_name} ({expected_fname})",
@@ -56,22 +270,25 @@ def load_default_or_uploaded(label_key: str, display_name: str):
 
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
+            data = uploaded_file.getvalue()
+            df = _read_uploaded_csv(
+                uploaded_file.name, len(data), hash(data[:4096]), data
+            )
             src = "uploaded"
         except Exception as e:
             st.sidebar.error(f"Error reading uploaded {display_name}: {e}")
     else:
-        # Try loading from local baseline file in ROOT_DIR
-        baseline_path = os.path.join(ROOT_DIR, expected_fname)
-        if os.path.isfile(baseline_path):
-            try:
-                df = pd.read_csv(baseline_path)
-                src = "baseline"
-            except Exception as e:
-                st.sidebar.error(f"Error reading baseline {display_name}: {e}")
+        # Fall back to the baseline frame resolved for this rerun
+        if label_key in baselines:
+            df = baselines[label_key]
+            src = "baseline"
 
     if df is not None:
-        st.session_state.dataframes[label_key] = df
+        # Pointer compare only – skip the session_state write (and the
+        # downstream change detection it triggers) when the loader handed
+        # back the very same object as the previous rerun
+        if st.session_state.dataframes.get(label_key) is not df:
+            st.session_state.dataframes[label_key] = df
         if src == "uploaded":
             st.sidebar.success(f"{display_name}: using uploaded file")
         else:
@@ -79,16 +296,24 @@ def load_default_or_uploaded(label_key: str, display_name: str):
         return True
     else:
         st.sidebar.warning(f"{display_name}: no data available")
-        st.session_state.dataframes[label_key] = None
+        if st.session_state.dataframes.get(label_key) is not None:
+            st.session_state.dataframes[label_key] = None
         return False
 
 
+# Resolve the baseline frames once per rerun – calling the cached reader
+# inside each loader would hand back a fresh copy of the whole dict per
+# call, five times over
+baseline_frames, baseline_errors = _read_baselines(_baseline_signature())
+for _label, _err in baseline_errors.items():
+    st.sidebar.error(f"Error reading baseline {DISPLAY_NAMES[_label]}: {_err}")
+
 # 1) Upload / load each CSV
-avail_sales_hist = load_default_or_uploaded("sales_history", "Sales History (24m)")
-avail_prod_master = load_default_or_uploaded("products_master", "Products Master")
-avail_prod_lifecycle = load_default_or_uploaded("product_lifecycle", "Product Lifecycle")
-avail_sales_fcst = load_default_or_uploaded("sales_forecast", "Sales Forecast (12m)")
-avail_lt_hist = load_default_or_uploaded("leadtime_history", "Lead Time History (24m)")
+avail_sales_hist = load_default_or_uploaded("sales_history", baseline_frames)
+avail_prod_master = load_default_or_uploaded("products_master", baseline_frames)
+avail_prod_lifecycle = load_default_or_uploaded("product_lifecycle", baseline_frames)
+avail_sales_fcst = load_default_or_uploaded("sales_forecast", baseline_frames)
+avail_lt_hist = load_default_or_uploaded("leadtime_history", baseline_frames)
 
 all_available = (
     avail_sales_hist
@@ -133,8 +358,24 @@ st.session_state.params = {
 # -------------------------------------------------------------------
 # PLACEHOLDER: METHOD 5 SS CALCULATION
 # -------------------------------------------------------------------
+# Columns the SS model reads (besides the join key)
+SS_INPUT_COLS = ["avg_monthly_demand", "demand_std", "avg_lead_time", "lead_time_std"]
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _ss_kernel(d, ds, lt, lts, z, a, b, mn, mx_mult, out):
+        # One load + one store per element: arithmetic and clamp fused
+        for i in prange(d.shape[0]):
+            out[i] = min(
+                max(z * (ds[i] * a + lts[i] * b) * math.sqrt(lt[i]), mn),
+                mx_mult * d[i],
+            )
+
+
 def method5_compute_ss(
     merged_df: pd.DataFrame,
+    key: str,
     sl: float,
     min_ss: float,
     max_ss_mult: float,
@@ -146,7 +387,7 @@ def method5_compute_ss(
 
     EXPECTED INPUT:
     - merged_df: should contain, at minimum:
-        - 'material_shop' (or similar key)
+        - `key` ('material_shop' or similar)
         - 'avg_monthly_demand'
         - 'demand_std'
         - 'avg_lead_time'
@@ -154,54 +395,83 @@ def method5_compute_ss(
       The actual column names can be adapted once we know your model.
 
     CURRENT BEHAVIOR (dummy logic):
-    - Calculates a simple "risk index" from demand and lead time variability.
+    - Combines demand and lead time variability into a "risk index".
     - Scales safety stock roughly as avg_demand * sqrt(lead_time) * risk factors.
     - Clips to [min_ss, max_ss_mult * avg_monthly_demand].
-    - Returns merged_df with an added column 'SS_optimal'.
+    - Returns a compact frame with `key`, 'SS_optimal' and the model inputs,
+      rather than a copy of the whole merged dataset.
     """
 
-    df = merged_df.copy()
+    n = len(merged_df)
 
-    # --- PLACEHOLDER: define fallback columns if they don't yet exist ---
-    # If your data already has the right measures, remove these fallbacks
-    if "avg_monthly_demand" not in df.columns:
+    # --- PLACEHOLDER: fallback inputs when the columns don't yet exist ---
+    # Built as local arrays (not columns on a copied frame), so missing
+    # measures never force a full-frame duplication.
+    if "avg_monthly_demand" in merged_df.columns:
+        d = merged_df["avg_monthly_demand"].to_numpy(dtype=float)
+    else:
         # naive proxy: if you have a monthly fcst col, or use sales
-        numeric_cols = df.select_dtypes(include="number").columns
+        numeric_cols = merged_df.select_dtypes(include="number").columns
         if len(numeric_cols) > 0:
-            df["avg_monthly_demand"] = df[numeric_cols[0]].abs()
+            d = np.abs(merged_df[numeric_cols[0]].to_numpy(dtype=float))
         else:
-            df["avg_monthly_demand"] = 0.0
+            d = np.zeros(n)
 
-    if "demand_std" not in df.columns:
-        df["demand_std"] = df["avg_monthly_demand"] * 0.5
-
-    if "avg_lead_time" not in df.columns:
-        df["avg_lead_time"] = 1.0
+    if "demand_std" in merged_df.columns:
+        ds = merged_df["demand_std"].to_numpy(dtype=float)
+    else:
+        ds = d * 0.5
 
-    if "lead_time_std" not in df.columns:
-        df["lead_time_std"] = df["avg_lead_time"] * 0.3
+    if "avg_lead_time" in merged_df.columns:
+        lt = merged_df["avg_lead_time"].to_numpy(dtype=float)
+    else:
+        lt = np.ones(n)
 
-    # --- Dummy "risk index" ---
-    # (THIS IS NOT METHOD 5 – just a scaffold to visualize something.)
-    df["risk_index"] = (
-        df["demand_std"] * demand_var_factor
-        + df["lead_time_std"] * lt_var_factor
-    )
+    if "lead_time_std" in merged_df.columns:
+        lts = merged_df["lead_time_std"].to_numpy(dtype=float)
+    else:
+        lts = lt * 0.3
 
     # Rough proxy for a z-factor from SL; for now, map [0.8–0.99] to ~[0.85–2.33]
     # You would replace with the exact z from the normal distribution if Method 5 uses it.
     z_approx = 0.85 + (sl - 0.8) * (2.33 - 0.85) / (0.99 - 0.8)
     z_approx = max(0.0, z_approx)
 
-    df["SS_raw"] = z_approx * df["risk_index"] * (df["avg_lead_time"] ** 0.5)
-
-    # Clip SS to [min_ss, max_ss_mult * avg_monthly_demand]
-    df["SS_optimal"] = df["SS_raw"].clip(
-        lower=min_ss, upper=max_ss_mult * df["avg_monthly_demand"]
+    # SS arithmetic + clamp to [min_ss, max_ss_mult * avg_monthly_demand].
+    # (THIS IS NOT METHOD 5 – just a scaffold to visualize something.)
+    if njit is not None:
+        ss = np.empty_like(d)
+        _ss_kernel(
+            d,
+            ds,
+            lt,
+            lts,
+            z_approx,
+            demand_var_factor,
+            lt_var_factor,
+            float(min_ss),
+            float(max_ss_mult),
+            ss,
+        )
+    else:
+        # One fused NumPy pass, then clamp via the raw min/max ufuncs
+        # (two SIMD passes, no bound broadcasting overhead)
+        ss_raw = (
+            z_approx * (ds * demand_var_factor + lts * lt_var_factor) * np.sqrt(lt)
+        )
+        ss = np.minimum(np.maximum(ss_raw, min_ss), max_ss_mult * d)
+
+    return pd.DataFrame(
+        {
+            key: merged_df[key].to_numpy(),
+            "SS_optimal": ss,
+            "avg_monthly_demand": d,
+            "demand_std": ds,
+            "avg_lead_time": lt,
+            "lead_time_std": lts,
+        }
     )
 
-    return df
-
 
 # -------------------------------------------------------------------
 # DATA PREPARATION (JOINING TABLES)
@@ -272,21 +542,73 @@ def safe_merge(left: pd.DataFrame,
                how: str = "left",
                suffix: str = "") -> pd.DataFrame:
     """
-    Merge two dataframes on `key`, renaming overlapping columns in `right`
-    (except for the key) with the provided suffix.
+    Join `right` onto `left` on `key`; `left` must already be indexed by
+    `key` so the chain of joins reuses one index instead of re-hashing the
+    key column per merge. Overlapping columns in `right` (except for the
+    key, which moves into the index) get the provided suffix.
     """
-    common_cols = list(set(left.columns).intersection(set(right.columns)) - {key})
-    right_renamed = right.rename(
-        columns={c: f"{c}{suffix}" for c in common_cols}
-    )
-    return left.merge(right_renamed, on=key, how=how)
+    return left.join(right.set_index(key), how=how, rsuffix=suffix)
 
 
-df_working = sales_hist.copy()
-df_working = safe_merge(df_working, sales_fcst, join_key, how="left", suffix="_fcst")
-df_working = safe_merge(df_working, prod_master, join_key, how="left", suffix="_pm")
-df_working = safe_merge(df_working, prod_lifecycle, join_key, how="left", suffix="_pl")
-df_working = safe_merge(df_working, lt_hist, join_key, how="left", suffix="_lt")
+def build_working_dataset(
+    sales_hist: pd.DataFrame,
+    sales_fcst: pd.DataFrame,
+    prod_master: pd.DataFrame,
+    prod_lifecycle: pd.DataFrame,
+    lt_hist: pd.DataFrame,
+    key: str,
+) -> pd.DataFrame:
+    """
+    Merge the five sources into one working frame on `key`.
+
+    With polars installed, the four left joins run as one LazyFrame chain
+    so the optimizer fuses them into a single Rust pass; otherwise fall
+    back to the pandas indexed-join chain on a shared-category key.
+    """
+    rights = [
+        (sales_fcst, "_fcst"),
+        (prod_master, "_pm"),
+        (prod_lifecycle, "_pl"),
+        (lt_hist, "_lt"),
+    ]
+
+    if pl is not None:
+        lf = pl.from_pandas(sales_hist).lazy()
+        for right, suffix in rights:
+            lf = lf.join(
+                pl.from_pandas(right).lazy(), on=key, how="left", suffix=suffix
+            )
+        return lf.collect().to_pandas()
+
+    # Encode the join key as a categorical with one shared category set, so
+    # the joins compare integer codes instead of hashing strings. Categories
+    # must be identical across frames or pandas falls back to string compares.
+    key_frames = [
+        f for f in (sales_hist, *(r for r, _ in rights)) if key in f.columns
+    ]
+    shared_cats = pd.api.types.union_categoricals(
+        [f[key].astype("category") for f in key_frames]
+    ).categories
+
+    def _with_shared_key(f: pd.DataFrame) -> pd.DataFrame:
+        # assign() yields a shallow copy carrying the recoded key, leaving
+        # the input frame untouched – the sources come straight out of the
+        # cache_resource loaders and are shared across reruns
+        if key not in f.columns:
+            return f
+        return f.assign(**{key: pd.Categorical(f[key], categories=shared_cats)})
+
+    # Index once on the join key (drop=False keeps it as a column for display),
+    # then align every right frame against that index.
+    out = _with_shared_key(sales_hist).set_index(key, drop=False)
+    for right, suffix in rights:
+        out = safe_merge(out, _with_shared_key(right), key, how="left", suffix=suffix)
+    return out.reset_index(drop=True)
+
+
+df_working = build_working_dataset(
+    sales_hist, sales_fcst, prod_master, prod_lifecycle, lt_hist, join_key
+)
 
 st.write(f"Working dataset size after merges: {df_working.shape[0]} rows, {df_working.shape[1]} columns")
 
@@ -301,8 +623,24 @@ compute_btn = st.button("Compute Optimal SS by Material_Shop")
 
 if compute_btn:
     params = st.session_state.params
+
+    # Project the wide merged frame down to what the model reads. The
+    # frame's first numeric column rides along as the demand proxy
+    # fallback and must stay first among the projected numerics, so the
+    # "first numeric column" method5_compute_ss falls back on matches
+    # what it would have picked on the full frame.
+    model_cols = [join_key] + [c for c in SS_INPUT_COLS if c in df_working.columns]
+    if "avg_monthly_demand" not in df_working.columns:
+        numeric_cols = df_working.select_dtypes(include="number").columns
+        if len(numeric_cols) > 0 and numeric_cols[0] != join_key:
+            proxy_col = numeric_cols[0]
+            if proxy_col in model_cols:
+                model_cols.remove(proxy_col)
+            model_cols.insert(1, proxy_col)
+
     result_df = method5_compute_ss(
-        df_working,
+        df_working[model_cols],
+        key=join_key,
         sl=params["SL"],
         min_ss=params["min_ss"],
         max_ss_mult=params["max_ss_mult"],
@@ -310,13 +648,8 @@ if compute_btn:
         lt_var_factor=params["lt_var_factor"],
     )
 
-    # Extract only a few key columns for display
-    display_cols = [join_key, "SS_optimal"]
-    for c in ["avg_monthly_demand", "demand_std", "avg_lead_time", "lead_time_std"]:
-        if c in result_df.columns:
-            display_cols.append(c)
-
-    result_view = result_df[display_cols].copy()
+    # result_df is already the compact key + SS + model-input view
+    result_view = result_df
 
     st.success("Safety Stock (SS) computed successfully (placeholder Method 5).")
     st.write(
@@ -333,9 +666,29 @@ if compute_btn:
             "Show only rows with SS_optimal ≥", min_value=0.0, value=0.0, step=1.0
         )
 
-    filtered = result_view.copy()
+    filtered = result_view
     if search_term:
-        filtered = filtered[filtered[join_key].astype(str).str.contains(search_term, case=False)]
+        # The lowered key array depends only on the source frames (row
+        # order survives the merges and the SS pass, and the parameters
+        # never touch the key), and the sources are identity-stable out
+        # of the cache_resource loaders – so rebuild it only when a
+        # source actually changes and reuse it across keystrokes
+        sources = tuple(st.session_state.dataframes[k] for k in EXPECTED_FILES)
+        cached = st.session_state.get("_key_filter_index")
+        if (
+            cached is None
+            or cached[0] != join_key
+            or any(a is not b for a, b in zip(cached[1], sources))
+        ):
+            keys_lower = (
+                result_view[join_key].astype(str).str.lower().to_numpy(dtype=str)
+            )
+            st.session_state["_key_filter_index"] = (join_key, sources, keys_lower)
+        else:
+            keys_lower = cached[2]
+        # Case-insensitive substring scan in one C pass (np.char.find)
+        # instead of a regex over an object-dtype Series per keystroke
+        filtered = filtered[np.char.find(keys_lower, search_term.lower()) >= 0]
     filtered = filtered[filtered["SS_optimal"] >= min_ss_filter]
 
     st.dataframe(filtered, use_container_width=True)